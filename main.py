@@ -2,80 +2,121 @@ import os
 import json
 import fitz  # PyMuPDF
 import re
+import heapq
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
+# Precompiled patterns shared by the text cleaning and extraction passes
+_RE_MULTISPACE = re.compile(r'\s{2,}')
+_RE_HYPHEN_BREAK = re.compile(r'(\w)-\s*(\w)')
+_RE_SINGLE_LETTER = re.compile(r'\b([A-Z])\s+([A-Za-z]+)\b')
+_RE_CAMEL = re.compile(r'([a-z])([A-Z][a-z]+)')
+_RE_PUNCT_CAP = re.compile(r'([.!?])([A-Z])')
+_RE_REPEAT_CHAR = re.compile(r'(.)\1{2,}')
+_RE_REPEAT_WORD = re.compile(r'(\w{2,})\s*\1{1,}')
+_RE_TRAILING_NUM = re.compile(r'\s+\d+$')
+_RE_URL = re.compile(r'(http[s]?://\S+|www\.\S+)', re.IGNORECASE)
+_RE_NON_WORD = re.compile(r'[^\w\s]')
+_RE_DEDUPE_STRIP = re.compile(r'[\d\W_]+')
+_RE_TRIPLE_CHAR = re.compile(r'(.)\1\1', re.DOTALL)
+_RE_NUMBERED_HEADING = re.compile(r'\s*\d+(?:\.\d+)*\s+')
+# Lines that are only a separator, page number or section number are never titles
+_RE_TITLE_NOISE = re.compile(r'[-=_*]{3,}|\s*(?:\d+(?:\.\d+)*|[A-Z])\s*')
+_RE_DIGIT = re.compile(r'\d')
+# List markers, page numbers, lone letters, roman numerals and separator rules are never headings
+_RE_HEADING_NOISE = re.compile(r'\d+\.?|\([a-zA-Z]\)|\([0-9]+\)|[a-zA-Z]\.|\s*\d+\s*|\s*[A-Za-z]\s*|\s*[IXVLDCM]+\s*|[-=_*]{3,}')
+_RE_LIST_ITEM = re.compile(r'\s*(\d+(\.\d+)*|[A-Z])\.')
+
+# Short words that do not count towards the garbled-text short-word ratio
+_COMMON_SHORT_WORDS = frozenset({'to', 'of', 'in', 'on', 'at', 'is', 'an', 'a', 'or', 'and', 'for', 'by', 'as', 'it', 'be', 'do', 'not', 'we', 'he', 'she', 'they', 'you', 'if', 'but', 'can', 'may', 'will', 'are', 'was', 'were', 'has', 'had', 'have', 'this', 'that', 'with', 'from', 'into', 'out', 'up', 'down', 'then', 'than', 'also', 'only', 'very', 'much'})
+# All-caps single-page titles that are real titles rather than flyer labels
+_ALLCAPS_TITLE_WHITELIST = frozenset({"TABLE OF CONTENTS", "CONTENTS", "INTRODUCTION", "SYLLABUS"})
+# Words typical of invitation/flyer snippets rather than titles
+_FLYER_WORDS = frozenset({"you're", "to", "a", "for", "date", "time", "rsvp", "invited", "park"})
+
+@lru_cache(maxsize=131072)
 def clean_text(text):
     """Cleans extracted text by removing extra spaces, fixing PDF artifacts, and handling repetitions."""
     if not text:
         return ""
     text = text.strip()
-    text = re.sub(r'\s{2,}', ' ', text)  # Replace multiple spaces with single space
-    text = re.sub(r'(\w)-\s*(\w)', r'\1\2', text)  # Fix hyphenated breaks
+    text = _RE_MULTISPACE.sub(' ', text)  # Replace multiple spaces with single space
+    if '-' in text:
+        text = _RE_HYPHEN_BREAK.sub(r'\1\2', text)  # Fix hyphenated breaks
     text = text.replace('\n', ' ')  # Replace newlines with spaces
-    text = re.sub(r'\b([A-Z])\s+([A-Za-z]+)\b', r'\1\2', text)  # Fix single-letter spacing
-    text = re.sub(r'([a-z])([A-Z][a-z]+)', r'\1 \2', text)  # Add space before capital
-    text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)  # Add space after punctuation
-    text = re.sub(r'(.)\1{2,}', r'\1', text)  # Reduce 3+ repeated characters to 1
-    text = re.sub(r'(\w{2,})\s*\1{1,}', r'\1', text)  # Remove repeated words/phrases
-    text = re.sub(r'\s+\d+$', '', text)  # Remove trailing numbers
-    text = re.sub(r'\.cdr$', '', text, flags=re.IGNORECASE)  # Remove .cdr extension
+    if not text.islower():  # The next three rules all need an uppercase letter
+        text = _RE_SINGLE_LETTER.sub(r'\1\2', text)  # Fix single-letter spacing
+        text = _RE_CAMEL.sub(r'\1 \2', text)  # Add space before capital
+        text = _RE_PUNCT_CAP.sub(r'\1 \2', text)  # Add space after punctuation
+    text = _RE_REPEAT_CHAR.sub(r'\1', text)  # Reduce 3+ repeated characters to 1
+    text = _RE_REPEAT_WORD.sub(r'\1', text)  # Remove repeated words/phrases
+    if text[-1:].isdecimal():
+        text = _RE_TRAILING_NUM.sub('', text)  # Remove trailing numbers
+    if text[-4:].lower() == '.cdr':
+        text = text[:-4]  # Remove .cdr extension
     text = text.strip()
     return text
 
+@lru_cache(maxsize=131072)
 def is_garbled_text(text):
     """Detects garbled text using heuristics."""
-    if not text or not text.replace(" ", ""):
+    if not text:
         return True
     cleaned_text = text.replace(" ", "")
-    alphanum_chars = sum(c.isalnum() for c in cleaned_text)
+    if not cleaned_text:
+        return True
+    alphanum_chars = sum(map(str.isalnum, cleaned_text))
     total_chars = len(cleaned_text)
     if total_chars > 0 and (alphanum_chars / total_chars < 0.4):
         return True
     words = text.split()
     if len(words) > 5:
-        word_counts = Counter(words)
-        most_common_word_count = word_counts.most_common(1)[0][1] if word_counts else 0
+        most_common_word_count = max(Counter(words).values(), default=0)
         if most_common_word_count / len(words) > 0.5:
             return True
     short_words_threshold = 3
-    common_short_words = {'to', 'of', 'in', 'on', 'at', 'is', 'an', 'a', 'or', 'and', 'for', 'by', 'as', 'it', 'be', 'do', 'not', 'we', 'he', 'she', 'they', 'you', 'if', 'but', 'can', 'may', 'will', 'are', 'was', 'were', 'has', 'had', 'have', 'this', 'that', 'with', 'from', 'into', 'out', 'up', 'down', 'then', 'than', 'also', 'only', 'very', 'much'}
-    short_words = [word for word in words if len(word) <= short_words_threshold and word.lower() not in common_short_words]
+    short_words = [word for word in words if len(word) <= short_words_threshold and word.lower() not in _COMMON_SHORT_WORDS]
     if len(words) > 10 and len(short_words) / len(words) > 0.5:
         return True
     if len(cleaned_text) > 10:
-        for i in range(len(cleaned_text) - 2):
-            if cleaned_text[i] == cleaned_text[i+1] == cleaned_text[i+2]:
-                return True
+        if _RE_TRIPLE_CHAR.search(cleaned_text):
+            return True
         for sub_len in range(2, 5):
             if len(cleaned_text) >= sub_len * 2:
-                for i in range(len(cleaned_text) - sub_len):
-                    sub = cleaned_text[i : i + sub_len]
-                    count = cleaned_text.count(sub)
-                    if count * sub_len > len(cleaned_text) * 0.6:
+                # Overlapping k-gram counts bound str.count from above, so only the
+                # few substrings frequent enough to cover 60% of the text need counting
+                ngram_counts = Counter(cleaned_text[i : i + sub_len] for i in range(len(cleaned_text) - sub_len + 1))
+                for sub, max_count in ngram_counts.items():
+                    if max_count * sub_len > len(cleaned_text) * 0.6 and \
+                       cleaned_text.count(sub) * sub_len > len(cleaned_text) * 0.6:
                         return True
     return False
 
+@lru_cache(maxsize=4096)
+def normalize_for_dedupe(text):
+    """Reduces heading text to its lowercase letters for duplicate detection."""
+    return _RE_DEDUPE_STRIP.sub('', text).lower()
+
 def filter_title_candidate(candidate_text, document_page_count, filename):
     """Filters title candidates."""
     if not candidate_text:
         return ""
-    if re.fullmatch(r'[-=_*]{3,}', candidate_text) or \
-       re.fullmatch(r'^\s*\d+\s*$', candidate_text) or \
+    if _RE_TITLE_NOISE.fullmatch(candidate_text) or \
        is_garbled_text(candidate_text) or \
-       re.match(r'^(http[s]?://\S+|www\.\S+)', candidate_text, re.IGNORECASE) or \
-       re.fullmatch(r'^\s*(\d+(\.\d+)*|[A-Z])\s*$', candidate_text):
+       _RE_URL.match(candidate_text):
         return ""
     if document_page_count == 1:
         if len(candidate_text) <= 20 and candidate_text.endswith(':'):
             return ""
         words_in_candidate = candidate_text.split()
         if len(words_in_candidate) <= 3 and all(word.isupper() for word in words_in_candidate) and \
-           candidate_text not in ["TABLE OF CONTENTS", "CONTENTS", "INTRODUCTION", "SYLLABUS"]:
+           candidate_text not in _ALLCAPS_TITLE_WHITELIST:
             return ""
         if len(candidate_text) <= 25 and len(words_in_candidate) <= 4 and \
-           any(w.lower() in ['you\'re', 'to', 'a', 'for', 'date', 'time', 'rsvp', 'invited', 'park'] for w in words_in_candidate):
+           any(w.lower() in _FLYER_WORDS for w in words_in_candidate):
             return ""
-        if re.search(r'\d', candidate_text) and \
+        if _RE_DIGIT.search(candidate_text) and \
            (len(candidate_text) < 30 or not any(word.isalpha() and len(word) > 4 for word in words_in_candidate)):
             return ""
         if candidate_text.startswith('(') and candidate_text.endswith(')'):
@@ -86,28 +127,21 @@ def filter_title_candidate(candidate_text, document_page_count, filename):
         return ""
     return candidate_text
 
-def is_likely_heading(text, font_size, is_bold, page_width, span_bbox, avg_body_font_size, header_footer_patterns, font_name, page_num, document_page_count):
+def is_likely_heading(text, font_size, is_bold, page_width, span_bbox, avg_body_font_size, min_heading_size, header_footer_re, has_bold_font_name, page_num, document_page_count):
     """Determines if text is a heading."""
     cleaned_text = clean_text(text)
     if not cleaned_text or len(cleaned_text) < 3:
         return False
-    if re.fullmatch(r'^\d+\.?$|^\([a-zA-Z]\)$|^\([0-9]+\)$|^[a-zA-Z]\.$', cleaned_text):
-        return False
-    if re.fullmatch(r'^\s*\d+\s*$', cleaned_text) or \
-       re.fullmatch(r'^\s*[A-Za-z]\s*$', cleaned_text) or \
-       re.fullmatch(r'^\s*[IXVLDCM]+\s*$', cleaned_text):
+    if _RE_HEADING_NOISE.fullmatch(cleaned_text):
         return False
-    if re.fullmatch(r'[-=_*]{3,}', cleaned_text):
+    if header_footer_re is not None and header_footer_re.search(cleaned_text):
         return False
-    for pattern in header_footer_patterns:
-        if re.search(re.escape(pattern), cleaned_text, re.IGNORECASE):
-            return False
-    if re.search(r'(http[s]?://\S+|www\.\S+)', cleaned_text, re.IGNORECASE):
+    if _RE_URL.search(cleaned_text):
         return False
     if cleaned_text in ["Ontario’s Libraries", "Working Together", "March 21"]:
         return False  # Exclude specific file 3 headings
     span_x0, span_x1 = span_bbox[0], span_bbox[2]
-    if re.match(r'^\s*(\d+(\.\d+)*|[A-Z])\.\s*.*', cleaned_text) and \
+    if _RE_LIST_ITEM.match(cleaned_text) and \
        (span_x1 - span_x0) < page_width * 0.5 and span_x0 < page_width * 0.2 and \
        (avg_body_font_size and abs(font_size - avg_body_font_size) < 0.5):
         return False
@@ -115,26 +149,26 @@ def is_likely_heading(text, font_size, is_bold, page_width, span_bbox, avg_body_
        (avg_body_font_size and font_size < avg_body_font_size * 1.1) and \
        document_page_count > 1:  # Stricter for multi-page docs
         return False
+    is_numbered_heading = _RE_NUMBERED_HEADING.match(cleaned_text) is not None
+    text_width_ratio = (span_x1 - span_x0) / page_width
+    center_offset = abs((span_x0 + span_x1) / 2 - page_width / 2)
     if document_page_count == 1:
-        text_width_ratio = (span_x1 - span_x0) / page_width
         if font_size > avg_body_font_size * 1.5 and text_width_ratio > 0.4 and \
-           abs((span_x0 + span_x1) / 2 - page_width / 2) < page_width * 0.2 and \
-           not re.match(r'^\s*(\d+(\.\d+)*)\s+.*', cleaned_text):
+           center_offset < page_width * 0.2 and \
+           not is_numbered_heading:
             return False
-    text_width_ratio = (span_x1 - span_x0) / page_width
     if page_width > 300 and text_width_ratio < 0.4 and span_x0 > page_width * 0.2:
         if not is_bold and (avg_body_font_size and font_size <= avg_body_font_size * 1.2):
             return False
-    if re.match(r'^\s*(\d+(\.\d+)*)\s+.*', cleaned_text) and \
-       (is_bold or any(f in font_name.lower() for f in ['bold', 'bd', 'black', 'heavy'])):
+    is_bold_font = is_bold or has_bold_font_name
+    if is_numbered_heading and is_bold_font:
         return True
-    if avg_body_font_size and font_size < avg_body_font_size * 1.05:
+    if avg_body_font_size and font_size < min_heading_size:
         return False
-    if (is_bold or any(f in font_name.lower() for f in ['bold', 'bd', 'black', 'heavy'])) and font_size >= avg_body_font_size * 1.05:
+    if is_bold_font and font_size >= min_heading_size:
         return True
     if font_size > avg_body_font_size * 1.2:
-        text_width_ratio = (span_x1 - span_x0) / page_width
-        if text_width_ratio < 0.9 and abs((span_x0 + span_x1) / 2 - page_width / 2) < page_width * 0.3:
+        if text_width_ratio < 0.9 and center_offset < page_width * 0.3:
             return True
         if span_x0 < page_width * 0.15:
             return True
@@ -142,97 +176,113 @@ def is_likely_heading(text, font_size, is_bold, page_width, span_bbox, avg_body_
 
 def extract_outline_from_pdf(pdf_path):
     """Extracts title and outline from a PDF."""
+    clean_text.cache_clear()  # Running headers repeat within a document, not across documents
+    is_garbled_text.cache_clear()
+    normalize_for_dedupe.cache_clear()
     title = ""
     outline = []
     try:
         document = fitz.open(pdf_path)
         filename = os.path.basename(pdf_path)
-        header_footer_candidates = defaultdict(int)
-        if document.page_count > 0:
-            page_height = document[0].rect.height
-            top_margin_threshold = page_height * 0.1
-            bottom_margin_threshold = page_height * 0.9
-            for page_num in range(min(document.page_count, 5)):
-                page = document[page_num]
-                blocks = page.get_text("dict")["blocks"]
-                for b in blocks:
-                    if b['type'] == 0:
-                        for line_dict in b["lines"]:
-                            line_text = clean_text(" ".join([s["text"] for s in line_dict["spans"]]))
-                            line_y0 = line_dict["bbox"][1]
-                            if line_text and len(line_text) > 3 and not re.fullmatch(r'^\s*\d+\s*$', line_text) and \
-                               not is_garbled_text(line_text) and not re.fullmatch(r'[-=_*]{3,}', line_text) and \
-                               re.search(r'(http[s]?://\S+|www\.\S+)', line_text, re.IGNORECASE) is None:
-                                if line_y0 < top_margin_threshold or line_y0 > bottom_margin_threshold:
-                                    header_footer_candidates[line_text] += 1
-            header_footer_patterns = [text for text, count in header_footer_candidates.items() if count > document.page_count * 0.5]
-        else:
-            header_footer_patterns = []
+        page_count = document.page_count
+
+        # Parse every page once, building the font-size histogram and collecting
+        # header/footer candidates from the first 5 pages in the same pass; title
+        # and heading detection reuse the cached blocks, so only the first page
+        # object has to outlive this loop
+        pages_blocks = []
+        page_widths = []
+        all_font_sizes_counts = Counter()
+        header_footer_lines = []
+        for page_num in range(page_count):
+            page = document[page_num]
+            # Image blocks are never used; from PyMuPDF 1.19.6 these flags are the
+            # dict defaults minus images, which equal the get_text("text") defaults
+            textpage = page.get_textpage(flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+            page_rect = page.rect  # Each .rect access builds a new Rect
+            if page_num == 0:
+                first_page = page
+                first_page_textpage = textpage  # Also serves the plain-text title fallback
+                first_page_height = page_rect.height
+                top_margin_threshold = first_page_height * 0.1
+                bottom_margin_threshold = first_page_height * 0.9
+            blocks = page.get_text("dict", textpage=textpage)["blocks"]
+            pages_blocks.append(blocks)
+            page_widths.append(page_rect.width)
+            scan_margins = page_num < 5
+            for b in blocks:
+                if b['type'] == 0:
+                    for line in b["lines"]:
+                        all_font_sizes_counts.update([round(span["size"], 1) for span in line["spans"]])  # Counted in C
+                        if not scan_margins or top_margin_threshold <= line["bbox"][1] <= bottom_margin_threshold:
+                            continue  # Body text; only the page margins hold headers and footers
+                        line_text = clean_text(" ".join([s["text"] for s in line["spans"]]))
+                        # Page numbers (all digits) and separator rules (all -=_*) are skipped
+                        if line_text and len(line_text) > 3 and not line_text.strip().isdecimal() and \
+                           not is_garbled_text(line_text) and line_text.strip('-=_*') and \
+                           _RE_URL.search(line_text) is None:
+                            header_footer_lines.append(line_text)
+
+        header_footer_threshold = page_count * 0.5
+        header_footer_patterns = [text for text, count in Counter(header_footer_lines).items() if count > header_footer_threshold]
+        # A single alternation finds any header/footer text in one scan of the line
+        header_footer_re = re.compile("|".join(re.escape(p) for p in header_footer_patterns), re.IGNORECASE) if header_footer_patterns else None
 
         # Title extraction
         visual_title_candidates = []
         title_spans = []
-        if document.page_count > 0:
-            first_page = document[0]
-            text_blocks = first_page.get_text("dict")["blocks"]
-            for b in text_blocks:
+        if page_count > 0:
+            title_zone_y = first_page_height * 0.4  # Top 40% for title
+            for b in pages_blocks[0]:
                 if b['type'] == 0:
                     for line in b["lines"]:
                         for span in line["spans"]:
-                            if span["bbox"][1] < first_page.rect.height * 0.4:  # Top 40% for title
+                            if span["bbox"][1] < title_zone_y:
                                 cleaned_span_text = clean_text(span["text"])
                                 if cleaned_span_text and not is_garbled_text(cleaned_span_text):
+                                    font_lower = span["font"].lower()
                                     title_spans.append({
                                         "text": cleaned_span_text,
                                         "size": round(span["size"], 1),
                                         "bbox": span["bbox"],
-                                        "is_bold": "bold" in span["font"].lower() or "black" in span["font"].lower() or "heavy" in span["font"].lower(),
+                                        "is_bold": "bold" in font_lower or "black" in font_lower or "heavy" in font_lower,
                                         "font": span["font"]
                                     })
             title_spans.sort(key=lambda x: (x["bbox"][1], x["bbox"][0]))
             max_size_found_so_far = 0
             seen_texts = set()
+            last_span_y = title_spans[-1]["bbox"][1] if title_spans else 0
             for span_info in title_spans:
                 cleaned_text = span_info["text"]
-                if len(cleaned_text) > 3 and not re.fullmatch(r'^\s*\d+\s*$', cleaned_text) and \
-                   not re.fullmatch(r'[-=_*]{3,}', cleaned_text) and not is_garbled_text(cleaned_text) and \
-                   re.search(r'(http[s]?://\S+|www\.\S+)', cleaned_text, re.IGNORECASE) is None and \
+                if len(cleaned_text) > 3 and not cleaned_text.strip().isdecimal() and \
+                   cleaned_text.strip('-=_*') and \
+                   _RE_URL.search(cleaned_text) is None and \
                    cleaned_text not in seen_texts:
                     if span_info["size"] > max_size_found_so_far + 0.5:
                         max_size_found_so_far = span_info["size"]
                         visual_title_candidates = [cleaned_text]
                         seen_texts = {cleaned_text}
                     elif abs(span_info["size"] - max_size_found_so_far) <= 1.0 and \
-                         (not visual_title_candidates or abs(span_info["bbox"][1] - title_spans[-1]["bbox"][1]) < span_info["size"] * 4):
+                         (not visual_title_candidates or abs(span_info["bbox"][1] - last_span_y) < span_info["size"] * 4):
                         visual_title_candidates.append(cleaned_text)
                         seen_texts.add(cleaned_text)
             if visual_title_candidates:
-                title_text = clean_text(" ".join(visual_title_candidates)).strip()
-                title = filter_title_candidate(title_text, document.page_count, filename)
+                title_text = clean_text(" ".join(visual_title_candidates))
+                title = filter_title_candidate(title_text, page_count, filename)
         if not title and document.metadata and document.metadata.get("title"):
             meta_title = clean_text(document.metadata.get("title"))
-            title = filter_title_candidate(meta_title, document.page_count, filename)
-        if not title and document.page_count > 0:
-            first_page_text = document[0].get_text("text").strip()
+            title = filter_title_candidate(meta_title, page_count, filename)
+        if not title and page_count > 0:
+            first_page_text = first_page.get_text("text", textpage=first_page_textpage).strip()
             if first_page_text:
                 for line in first_page_text.split('\n'):
-                    cleaned_line = clean_text(line).strip()
-                    filtered_line = filter_title_candidate(cleaned_line, document.page_count, filename)
+                    cleaned_line = clean_text(line)
+                    filtered_line = filter_title_candidate(cleaned_line, page_count, filename)
                     if filtered_line:
                         title = filtered_line
                         break
 
         # Font size analysis
-        all_font_sizes_counts = Counter()
-        for page_num in range(document.page_count):
-            page = document[page_num]
-            blocks = page.get_text("dict")["blocks"]
-            for b in blocks:
-                if b['type'] == 0:
-                    for line in b["lines"]:
-                        for span in line["spans"]:
-                            fs = round(span["size"], 1)
-                            all_font_sizes_counts[fs] += 1
         avg_body_font_size = 0
         if all_font_sizes_counts:
             filtered_sizes_for_body = {fs: count for fs, count in all_font_sizes_counts.items() if fs >= 9 and fs < 20}
@@ -244,44 +294,74 @@ def extract_outline_from_pdf(pdf_path):
                     avg_body_font_size = max(filtered_sizes_for_body, key=filtered_sizes_for_body.get)
                 else:
                     avg_body_font_size = max(all_font_sizes_counts, key=all_font_sizes_counts.get)
-        if avg_body_font_size == 0 and document.page_count > 0:
+        if avg_body_font_size == 0 and page_count > 0:
             sample_span = None
-            for b in document[0].get_text("dict")["blocks"]:
+            for b in pages_blocks[0]:
                 if b['type'] == 0 and b["lines"]:
                     sample_span = b["lines"][0]["spans"][0]
                     break
             avg_body_font_size = round(sample_span["size"], 1) if sample_span else 10
 
         # Heading detection
+        min_heading_size = avg_body_font_size * 1.05
         potential_headings_with_sizes = []
-        title_normalized = re.sub(r'[^\w\s]', '', title).lower().strip() if title else ""
-        title_words = set(title_normalized.split()) if title_normalized else set()
-        for page_num in range(document.page_count):
-            page = document[page_num]
-            page_width = page.rect.width
-            blocks = page.get_text("dict")["blocks"]
-            for b_idx, b in enumerate(blocks):
+        title_normalized = _RE_NON_WORD.sub('', title).lower().strip() if title else ""
+        title_normalized_len = len(title_normalized)
+        title_words = frozenset(title_normalized.split())
+        for page_num in range(page_count):
+            page_width = page_widths[page_num]
+            for b_idx, b in enumerate(pages_blocks[page_num]):
                 if b['type'] == 0:
                     for line_idx, line_dict in enumerate(b["lines"]):
-                        current_line_spans = sorted(line_dict["spans"], key=lambda x: x["bbox"][0])
-                        full_line_text = " ".join([span["text"] for span in current_line_spans])
-                        full_line_text_cleaned = clean_text(full_line_text)
-                        if not full_line_text_cleaned or is_garbled_text(full_line_text_cleaned):
-                            continue
-                        normalized_heading = re.sub(r'[^\w\s]', '', full_line_text_cleaned).lower().strip()
-                        if title_normalized and (
-                            normalized_heading == title_normalized or
-                            (len(normalized_heading) > 5 and normalized_heading in title_normalized and abs(len(normalized_heading) - len(title_normalized)) < 20) or
-                            (len(title_normalized) > 5 and title_normalized in normalized_heading and abs(len(title_normalized) - len(normalized_heading)) < 20) or
-                            (len(normalized_heading.split()) <= 2 and normalized_heading in title_words)
-                        ):
+                        current_line_spans = line_dict["spans"]
+                        if any(current_line_spans[i]["bbox"][0] > current_line_spans[i + 1]["bbox"][0] for i in range(len(current_line_spans) - 1)):
+                            current_line_spans = sorted(current_line_spans, key=lambda x: x["bbox"][0])  # Spans usually arrive in reading order
+                        if not current_line_spans:
                             continue
                         first_span_in_group = current_line_spans[0]
                         line_font_size = round(first_span_in_group["size"], 1)
-                        line_is_bold = "bold" in first_span_in_group["font"].lower() or "black" in first_span_in_group["font"].lower() or "heavy" in first_span_in_group["font"].lower()
-                        line_bbox = (min(s["bbox"][0] for s in current_line_spans), min(s["bbox"][1] for s in current_line_spans),
-                                     max(s["bbox"][2] for s in current_line_spans), max(s["bbox"][3] for s in current_line_spans))
-                        if is_likely_heading(full_line_text_cleaned, line_font_size, line_is_bold, page_width, line_bbox, avg_body_font_size, header_footer_patterns, first_span_in_group["font"], page_num, document.page_count):
+                        font_lower = first_span_in_group["font"].lower()
+                        line_is_bold = "bold" in font_lower or "black" in font_lower or "heavy" in font_lower
+                        has_bold_font_name = line_is_bold or "bd" in font_lower  # Bold, Bd, Black or Heavy face
+                        # Body-size text in a regular font can never pass is_likely_heading; skip the string work
+                        if avg_body_font_size and line_font_size < min_heading_size and not has_bold_font_name:
+                            continue
+                        single_span = len(current_line_spans) == 1  # Most lines hold a single span
+                        if single_span:
+                            full_line_text = first_span_in_group["text"]
+                        else:
+                            full_line_text = " ".join([span["text"] for span in current_line_spans])
+                        full_line_text_cleaned = clean_text(full_line_text)
+                        if not full_line_text_cleaned or is_garbled_text(full_line_text_cleaned):
+                            continue
+                        normalized_heading = _RE_NON_WORD.sub('', full_line_text_cleaned).lower().strip()
+                        if title_normalized:
+                            # Length tests first so most lines never reach a substring scan; title
+                            # words hold no whitespace, so a member is always a one-word heading
+                            normalized_heading_len = len(normalized_heading)
+                            if normalized_heading == title_normalized or normalized_heading in title_words:
+                                continue
+                            if abs(normalized_heading_len - title_normalized_len) < 20 and (
+                                (normalized_heading_len > 5 and normalized_heading in title_normalized) or
+                                (title_normalized_len > 5 and title_normalized in normalized_heading)
+                            ):
+                                continue
+                        if single_span:
+                            line_bbox = tuple(first_span_in_group["bbox"])
+                        else:
+                            x0, y0, x1, y1 = first_span_in_group["bbox"]
+                            for s in current_line_spans:  # Union of the span boxes in one pass
+                                span_x0, span_y0, span_x1, span_y1 = s["bbox"]
+                                if span_x0 < x0:
+                                    x0 = span_x0
+                                if span_y0 < y0:
+                                    y0 = span_y0
+                                if span_x1 > x1:
+                                    x1 = span_x1
+                                if span_y1 > y1:
+                                    y1 = span_y1
+                            line_bbox = (x0, y0, x1, y1)
+                        if is_likely_heading(full_line_text_cleaned, line_font_size, line_is_bold, page_width, line_bbox, avg_body_font_size, min_heading_size, header_footer_re, has_bold_font_name, page_num, page_count):
                             potential_headings_with_sizes.append({
                                 "text": full_line_text_cleaned,
                                 "size": line_font_size,
@@ -325,72 +405,53 @@ def extract_outline_from_pdf(pdf_path):
             })
 
         # Heading level assignment
-        h_level_map = {}
-        if combined_headings:
-            unique_heading_sizes = sorted(list(set([h["size"] for h in combined_headings])), reverse=True)
-            if len(unique_heading_sizes) >= 1:
-                h_level_map[unique_heading_sizes[0]] = "H1"
-            if len(unique_heading_sizes) >= 2:
-                h_level_map[unique_heading_sizes[1]] = "H2"
-            if len(unique_heading_sizes) >= 3:
-                h_level_map[unique_heading_sizes[2]] = "H3"
-            if len(unique_heading_sizes) >= 4:
-                h_level_map[unique_heading_sizes[3]] = "H4"
-            defined_sizes = sorted(h_level_map.keys())
-            for size in unique_heading_sizes:
-                if size not in h_level_map:
-                    assigned_level = None
-                    for defined_size in defined_sizes:
-                        if size >= defined_size - 0.5:
-                            assigned_level = h_level_map[defined_size]
-                            break
-                    if assigned_level:
-                        h_level_map[size] = assigned_level
-                    else:
-                        if "H4" in h_level_map.values():
-                            h_level_map[size] = "H4"
-                        elif "H3" in h_level_map.values():
-                            h_level_map[size] = "H3"
-                        elif "H2" in h_level_map.values():
-                            h_level_map[size] = "H2"
-                        elif "H1" in h_level_map.values():
-                            h_level_map[size] = "H1"
+        # The four largest sizes map to levels 1-4; any smaller size is below the
+        # level 4 size and therefore also becomes level 4
+        unique_heading_sizes = {h["size"] for h in combined_headings}
+        h_level_map = dict.fromkeys(unique_heading_sizes, 4)
+        h_level_map.update(zip(heapq.nlargest(4, unique_heading_sizes), (1, 2, 3, 4)))
 
         # Build outline
-        seen_headings_tracker = set()
+        seen_heading_pages = defaultdict(set)  # (normalized text, level) -> pages it was added on
         last_added_heading_level_val = 0
         for heading_info in combined_headings:
             full_line_text_cleaned = heading_info["text"]
-            line_font_size = heading_info["size"]
             page_num = heading_info["page"]
-            assigned_level = h_level_map.get(line_font_size)
-            if assigned_level and full_line_text_cleaned not in ["International Software Testing Qualifications Board"]:
-                current_level_val = int(assigned_level[1])
-                normalized_text_for_dedupe = re.sub(r'[\d\W_]+', '', full_line_text_cleaned).lower()
-                is_duplicate = False
-                for prev_norm_text, prev_page, prev_level_id in seen_headings_tracker:
-                    if normalized_text_for_dedupe == prev_norm_text and abs(page_num - prev_page) <= 1 and assigned_level == prev_level_id:
-                        is_duplicate = True
-                        break
+            if full_line_text_cleaned not in ["International Software Testing Qualifications Board"]:
+                current_level_val = h_level_map[heading_info["size"]]
+                normalized_text_for_dedupe = normalize_for_dedupe(full_line_text_cleaned)
+                prev_pages = seen_heading_pages.get((normalized_text_for_dedupe, current_level_val), ())
+                is_duplicate = page_num in prev_pages or page_num - 1 in prev_pages or page_num + 1 in prev_pages
                 if not is_duplicate:
                     if last_added_heading_level_val != 0 and current_level_val > last_added_heading_level_val + 1:
-                        promoted_level_val = last_added_heading_level_val + 1
-                        assigned_level = f"H{promoted_level_val}"
-                        current_level_val = promoted_level_val
+                        current_level_val = last_added_heading_level_val + 1
                     outline.append({
-                        "level": assigned_level,
+                        "level": f"H{current_level_val}",
                         "text": full_line_text_cleaned,
                         "page": page_num
                     })
-                    seen_headings_tracker.add((normalized_text_for_dedupe, page_num, assigned_level))
+                    seen_heading_pages[(normalized_text_for_dedupe, current_level_val)].add(page_num)
                     last_added_heading_level_val = current_level_val
-        final_outline = [entry for entry in outline if entry["text"] and entry["level"] in ["H1", "H2", "H3", "H4"]]
-        final_outline.sort(key=lambda x: (x["page"], int(x["level"][1])))
+        outline.sort(key=lambda x: (x["page"], x["level"]))  # "H1".."H4" sort the same as their level numbers
         document.close()
     except Exception as e:
         print(f"Error processing {pdf_path}: {e}")
         return {"title": "", "outline": []}
-    return {"title": title, "outline": final_outline}
+    return {"title": title, "outline": outline}
+
+def process_pdf_file(pdf_path, output_dir):
+    """Extracts the outline of a single PDF and writes it to output_dir as JSON."""
+    pdf_file = os.path.basename(pdf_path)
+    try:
+        output_filename = os.path.splitext(pdf_file)[0] + ".json"
+        output_path = os.path.join(output_dir, output_filename)
+        print(f"Processing {pdf_file}...")
+        result = extract_outline_from_pdf(pdf_path)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f"Saved outline to {output_path}")
+    except Exception as e:
+        print(f"Failed to process {pdf_file}: {e}")
 
 def main():
     input_dir = "input"
@@ -401,21 +462,19 @@ def main():
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     pdf_files = [f for f in os.listdir(input_dir) if f.lower().endswith(".pdf")]
+    pdf_paths = []
     for pdf_file in pdf_files:
-        try:
-            pdf_path = os.path.join(input_dir, pdf_file)
-            if not os.path.isfile(pdf_path):
-                print(f"Skipping {pdf_file}: Not a valid file.")
-                continue
-            output_filename = os.path.splitext(pdf_file)[0] + ".json"
-            output_path = os.path.join(output_dir, output_filename)
-            print(f"Processing {pdf_file}...")
-            result = extract_outline_from_pdf(pdf_path)
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(result, f, indent=4, ensure_ascii=False)
-            print(f"Saved outline to {output_path}")
-        except Exception as e:
-            print(f"Failed to process {pdf_file}: {e}")
+        pdf_path = os.path.join(input_dir, pdf_file)
+        if not os.path.isfile(pdf_path):
+            print(f"Skipping {pdf_file}: Not a valid file.")
+            continue
+        pdf_paths.append(pdf_path)
+    if not pdf_paths:
+        return
+    # Each PDF is independent, so spread them across worker processes; never
+    # start more workers than there are files to process
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(pdf_paths))) as executor:
+        list(executor.map(process_pdf_file, pdf_paths, [output_dir] * len(pdf_paths)))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file